@@ -3,24 +3,28 @@ from app.services.model_service import ModelService
 from app.services.prediction_service import PredictionService
 from app.services.transformer_service import TransformerService
 
+# Трансформер не хранит состояния запроса, поэтому один экземпляр разделяется всеми запросами
+_transformer_service = TransformerService()
 
-def get_model_service() -> ModelService:
+
+async def get_model_service() -> ModelService:
     """
     Провайдер сервиса модели.
-    Гарантирует загрузку модели.
+    Модель загружается и прогревается при старте приложения (ModelService.warmup).
+    Объявлен async: работы, блокирующей цикл событий, здесь нет,
+    поэтому FastAPI вызывает его без переключения в пул потоков.
     """
-    ModelService.load_model()
     return ModelService
 
 
-def get_transformer_service() -> TransformerService:
+async def get_transformer_service() -> TransformerService:
     """
     Провайдер сервиса трансформации данных.
     """
-    return TransformerService()
+    return _transformer_service
 
 
-def get_prediction_service(
+async def get_prediction_service(
     model_service: ModelService = Depends(get_model_service),
     transformer_service: TransformerService = Depends(get_transformer_service),
 ) -> PredictionService:
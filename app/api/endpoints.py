@@ -1,7 +1,10 @@
+import asyncio
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from app.models.api_schemas import RawApartmentInput, PredictionResponse
 from app.api.dependencies import get_prediction_service
+from app.api.responses import ORJSONResponse
+from app.core.config import settings
 from app.services.prediction_service import PredictionService
 
 router = APIRouter()
@@ -13,15 +16,42 @@ async def predict_price(items: List[RawApartmentInput], service: PredictionServi
     API Эндпоинт для предсказания цены аренды.
 
     Принимает список квартир, делегирует обработку в PredictionService.
+    Предсказания конкурентных запросов объединяются микро-батчером модели;
+    крупные пакеты обрабатываются в пуле потоков, чтобы не блокировать цикл событий.
 
     - **items**: Список объектов с данными о квартирах.
     - **return**: Список прогнозов с диапазонами цен.
     """
     try:
-        return service.make_prediction(items)
+        if len(items) > settings.PREDICT_OFFLOAD_THRESHOLD:
+            return await asyncio.get_running_loop().run_in_executor(None, service.make_prediction, items)
+        return await service.make_prediction_async(items)
     except ValueError as e:
         # Ошибки валидации данных или бизнес-логики
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
         # Внутренние ошибки выполнения модели
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/predict/batch", response_class=ORJSONResponse, responses={200: {"model": PredictionResponse}})
+async def predict_price_batch(
+    items: List[RawApartmentInput], service: PredictionService = Depends(get_prediction_service)
+):
+    """
+    API Эндпоинт для пакетного предсказания цены аренды.
+
+    Формат ответа совпадает с /predict, но ответ собирается из простых словарей
+    и сериализуется orjson без построения Pydantic-моделей — для больших пакетов.
+    Обработка выполняется в пуле потоков.
+
+    - **items**: Список объектов с данными о квартирах.
+    - **return**: Список прогнозов с диапазонами цен.
+    """
+    try:
+        content = await asyncio.get_running_loop().run_in_executor(None, service.make_batch_prediction, items)
+        return ORJSONResponse(content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,14 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON-ответ, сериализуемый через orjson (C-реализация, в разы быстрее стандартного json).
+    Предназначен для эндпоинтов, возвращающих простые словари: ответы с response_model FastAPI
+    быстрее сериализует сам через pydantic-core, поэтому глобально этот класс не подключается.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
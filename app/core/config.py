@@ -16,10 +16,28 @@ class Settings(BaseSettings):
     MODEL_PATH: Path = BASE_DIR / "models" / "catboost_price_predictor.cbm"
 
     # --- ML Параметры ---
+    # Число потоков CatBoost при предсказании (-1 — все доступные ядра)
+    PREDICT_THREAD_COUNT: int = -1
     # Границы диапазона цены, используемые для отображения "вилки" цены
     PREDICTION_MARGIN_PERCENT: float = 0.15
     SHAP_INFLUENCE_ROUND_PRECISION: int = 4
 
+    # --- Микро-батчинг предсказаний ---
+    # Окно (мс) ожидания попутных запросов перед вызовом модели. По умолчанию 0: запросы и так
+    # накапливаются в очереди, пока выполняется предыдущий вызов, а фиксированное окно лишь добавляет задержку
+    PREDICT_BATCH_WINDOW_MS: float = 0.0
+    # Максимальное число строк в объединенном пакете (больший одиночный запрос выполняется отдельно)
+    PREDICT_MAX_BATCH: int = 32
+    # Пакеты больше этого размера обрабатываются в пуле потоков, чтобы не блокировать цикл событий
+    PREDICT_OFFLOAD_THRESHOLD: int = 16
+    # Размер пула потоков для вызовов модели. Каждый вызов уже использует PREDICT_THREAD_COUNT потоков OpenMP
+    # (по умолчанию все ядра), поэтому ограничивается именно пул: потоков в сумме не больше workers x ядра
+    PREDICT_EXECUTOR_WORKERS: int = 2
+
+    # --- Трансформация ---
+    # Размер LRU-кэша производных признаков (одинаковые объявления не разбираются повторно; 0 — без кэша)
+    TRANSFORM_CACHE_SIZE: int = 4096
+
     # --- Логирование ---
     LOG_LEVEL: str = "INFO"
 
@@ -1,4 +1,6 @@
+import asyncio
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI
 from loguru import logger
 from app.api.endpoints import router as api_router
@@ -25,13 +27,24 @@ async def startup_event():
     Событие запуска приложения.
     """
     logger.info("Запуск приложения...")
+    # Выделенный пул потоков для CPU-нагрузки (вызовы модели); размер ограничен, т.к. CatBoost многопоточен сам
+    executor = ThreadPoolExecutor(max_workers=settings.PREDICT_EXECUTOR_WORKERS)
+    asyncio.get_running_loop().set_default_executor(executor)
     try:
-        ModelService.load_model()
+        ModelService.warmup()
     except Exception as e:
         logger.critical(f"Сбой запуска: Не удалось загрузить модель. Ошибка: {e}")
         sys.exit(1)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Событие остановки приложения.
+    """
+    await ModelService.stop_batching()
+
+
 @app.get("/health")
 def health_check():
     """
@@ -1,5 +1,7 @@
-from typing import List, Optional, Any
-from pydantic import BaseModel, Field
+import operator
+from dataclasses import dataclass
+from typing import List, Optional, Any, Tuple
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class FeatureContribution(BaseModel):
@@ -7,14 +9,70 @@ class FeatureContribution(BaseModel):
     Вклад отдельного признака в предсказание цены.
     """
 
+    model_config = ConfigDict(frozen=True)
+
     feature_name: str = Field(..., examples=["total_area"], description="Название признака")
     influence: float = Field(..., examples=[0.05], description="Величина влияния признака на предсказание")
 
 
-class ModelFeatures(BaseModel):
+# Порядок признаков, который ожидает модель
+FEATURE_NAMES: Tuple[str, ...] = (
+    "metro_nearest_time",
+    "total_area",
+    "floor",
+    "has_bath_flg",
+    "has_shower_flg",
+    "has_internet_flg",
+    "has_ac_flg",
+    "has_room_furniture_flg",
+    "has_kitchen_furniture_flg",
+    "has_dishwasher_flg",
+    "has_washer_flg",
+    "has_tv_flg",
+    "has_fridge_flg",
+    "utility_fixed_bill",
+    "utility_usage_bill_flg",
+    "utility_counters_extra_flg",
+    "comission",
+    "prepayment_months_cnt",
+    "rent_term_months_cnt",
+    "combined_bathrooms_cnt",
+    "separate_bathrooms_cnt",
+    "repair_cat",
+    "freight_elevators_cnt",
+    "passenger_elevators_cnt",
+    "parking_cat",
+    "heating_cat",
+    "balcony_cnt",
+    "loggia_cnt",
+    "has_garbage_chute_flg",
+    "has_concierge_flg",
+    "entrances_cnt",
+    "individual_project_flg",
+    "era_cat",
+    "house_type_monolithic_flg",
+    "house_type_monolithic_brick_flg",
+    "house_type_panel_flg",
+    "district_krasnogvardeysky_flg",
+    "district_krasnoselsky_flg",
+    "district_moskovsky_flg",
+    "district_nevsky_flg",
+    "district_other_flg",
+    "district_primorsky_flg",
+    "district_vyborgsky_flg",
+)
+
+# Извлекает значения всех признаков одним вызовом на C-уровне
+_FEATURE_GETTER = operator.attrgetter(*FEATURE_NAMES)
+
+
+@dataclass(slots=True, frozen=True)
+class ModelFeatures:
     """
     Строго типизированная структура признаков для ML-модели.
     Описывает вектор признаков, который ожидает CatBoost модель.
+    Это внутренний DTO (данные уже провалидированы на входе API), поэтому вместо Pydantic
+    используется неизменяемый dataclass со __slots__ — без валидации и без __dict__.
     """
 
     metro_nearest_time: int
@@ -62,55 +120,11 @@ class ModelFeatures(BaseModel):
     district_vyborgsky_flg: int
 
     @classmethod
-    def get_feature_names(cls) -> List[str]:
-        return [
-            "metro_nearest_time",
-            "total_area",
-            "floor",
-            "has_bath_flg",
-            "has_shower_flg",
-            "has_internet_flg",
-            "has_ac_flg",
-            "has_room_furniture_flg",
-            "has_kitchen_furniture_flg",
-            "has_dishwasher_flg",
-            "has_washer_flg",
-            "has_tv_flg",
-            "has_fridge_flg",
-            "utility_fixed_bill",
-            "utility_usage_bill_flg",
-            "utility_counters_extra_flg",
-            "comission",
-            "prepayment_months_cnt",
-            "rent_term_months_cnt",
-            "combined_bathrooms_cnt",
-            "separate_bathrooms_cnt",
-            "repair_cat",
-            "freight_elevators_cnt",
-            "passenger_elevators_cnt",
-            "parking_cat",
-            "heating_cat",
-            "balcony_cnt",
-            "loggia_cnt",
-            "has_garbage_chute_flg",
-            "has_concierge_flg",
-            "entrances_cnt",
-            "individual_project_flg",
-            "era_cat",
-            "house_type_monolithic_flg",
-            "house_type_monolithic_brick_flg",
-            "house_type_panel_flg",
-            "district_krasnogvardeysky_flg",
-            "district_krasnoselsky_flg",
-            "district_moskovsky_flg",
-            "district_nevsky_flg",
-            "district_other_flg",
-            "district_primorsky_flg",
-            "district_vyborgsky_flg",
-        ]
+    def get_feature_names(cls) -> Tuple[str, ...]:
+        return FEATURE_NAMES
 
     def to_list(self) -> List[Any]:
-        return [getattr(self, name) for name in self.get_feature_names()]
+        return list(_FEATURE_GETTER(self))
 
 
 class ApartmentFeaturesInput(BaseModel):
@@ -185,6 +199,8 @@ class PredictionResponseItem(BaseModel):
     Объект результата предсказания для одной квартиры.
     """
 
+    model_config = ConfigDict(frozen=True)
+
     predicted_price: int = Field(..., examples=[62000], description="Предсказанная цена")
     price_range_low: int = Field(..., examples=[52700], description="Нижняя граница")
     price_range_high: int = Field(..., examples=[71300], description="Верхняя граница")
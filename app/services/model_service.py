@@ -1,6 +1,7 @@
-from catboost import CatBoostRegressor
+import asyncio
+import numpy as np
+from catboost import CatBoostRegressor, FeaturesData, Pool
 from loguru import logger
-import shap
 from app.core.config import settings
 
 
@@ -11,13 +12,15 @@ class ModelService:
     """
 
     _model = None
-    _explainer = None
-    _feature_names = []
+    _feature_names = ()
+    _feature_index = {}
+    _batch_queue = None
+    _batch_worker = None
 
     @classmethod
     def load_model(self):
         """
-        Загружает модель в память и инициализирует SHAP explainer.
+        Загружает модель в память (SHAP values считаются самой CatBoost-моделью).
         """
         if self._model is None:
             logger.info(f"Загрузка модели из: {settings.MODEL_PATH}")
@@ -26,46 +29,152 @@ class ModelService:
                 raise FileNotFoundError(f"Model not found at {settings.MODEL_PATH}")
 
             try:
-                # 1. Загрузка CatBoost
+                # Загрузка CatBoost
                 self._model = CatBoostRegressor()
                 self._model.load_model(str(settings.MODEL_PATH))
-                self._feature_names = self._model.feature_names_
+                self._feature_names = tuple(self._model.feature_names_)
+                self._feature_index = {name: idx for idx, name in enumerate(self._feature_names)}
                 logger.info("Модель успешно загружена.")
-
-                # 2. Инициализация SHAP Explainer
-                logger.info("Инициализация SHAP Explainer...")
-                self._explainer = shap.TreeExplainer(self._model)
-                logger.info("SHAP Explainer готов.")
-
                 logger.debug(f"Признаки модели: {self._feature_names}")
             except Exception as e:
-                logger.critical(f"Не удалось загрузить модель или explainer: {e}")
+                logger.critical(f"Не удалось загрузить модель: {e}")
                 raise e
         return self._model
 
     @classmethod
-    def get_feature_names(cls):
-        if not cls._feature_names:
-            cls.load_model()
+    def warmup(cls):
+        """
+        Загружает модель и прогоняет пустой вектор через предсказание и SHAP,
+        чтобы буферы CatBoost и пул потоков инициализировались до первого запроса.
+        Вызывается при старте приложения; остальные методы рассчитывают на уже загруженную модель.
+        """
+        cls.load_model()
+        dummy = np.zeros((1, len(cls._feature_names)), dtype=np.float32)
+        cls.predict_and_explain(dummy)
+        logger.info("Прогрев модели завершен.")
+
+    @classmethod
+    def get_feature_names(cls) -> tuple:
         return cls._feature_names
 
     @classmethod
-    def predict(cls, data_pool) -> list:
+    def get_feature_index(cls) -> dict:
+        """
+        Возвращает отображение "имя признака -> номер колонки" в порядке, ожидаемом моделью.
+        """
+        return cls._feature_index
+
+    @classmethod
+    def predict_and_explain(cls, vectors) -> tuple:
+        """
+        Возвращает предсказания и SHAP values за один проход по деревьям модели.
+        Сумма строки SHAP values вместе с bias равна сырому предсказанию (RawFormulaVal),
+        поэтому отдельный вызов predict не нужен.
+        :param vectors: Матрица признаков (np.ndarray float32, shape [n, n_features]).
+        :return: Кортеж (предсказания shape [n], SHAP values shape [n, n_features]).
+        """
+        shap_values = cls._shap_values(vectors)
+        # Последняя колонка — ожидаемое значение (bias) модели, в объяснения она не входит
+        return shap_values.sum(axis=1), shap_values[:, :-1]
+
+    @classmethod
+    def _shap_values(cls, vectors) -> np.ndarray:
         """
-        Выполняет предсказание.
+        Полная матрица SHAP values от CatBoost, shape [n, n_features + 1] (последняя колонка — bias).
         """
-        model = cls.load_model()
-        return model.predict(data_pool)
+        return cls._model.get_feature_importance(
+            cls._make_pool(vectors), type="ShapValues", thread_count=settings.PREDICT_THREAD_COUNT
+        )
+
+    @staticmethod
+    def _make_pool(vectors) -> Pool:
+        """
+        Оборачивает матрицу признаков в Pool. Все признаки модели числовые (категории уже закодированы),
+        поэтому данные передаются через FeaturesData — без анализа типов колонок.
+        """
+        return Pool(data=FeaturesData(num_feature_data=np.ascontiguousarray(vectors, dtype=np.float32)))
+
+    @classmethod
+    async def predict_and_explain_async(cls, rows: np.ndarray) -> tuple:
+        """
+        Асинхронные предсказание и SHAP values через микро-батчер.
+        Запросы, накопившиеся в очереди (за окно PREDICT_BATCH_WINDOW_MS или пока выполнялся предыдущий
+        вызов модели), объединяются в один вызов, который выполняется в пуле потоков.
+        :param rows: Матрица признаков (np.ndarray float32, shape [n, n_features]).
+        :return: Кортеж (предсказания, SHAP values) для переданных строк.
+        """
+        loop = asyncio.get_running_loop()
+        if cls._batch_worker is None or cls._batch_worker.done() or cls._batch_worker.get_loop() is not loop:
+            cls._batch_queue = asyncio.Queue()
+            cls._batch_worker = loop.create_task(cls._run_batch_worker(cls._batch_queue))
+
+        future = loop.create_future()
+        await cls._batch_queue.put((rows, future))
+        return await future
 
     @classmethod
-    def explain(cls, vectors) -> list:
+    async def stop_batching(cls):
+        """
+        Останавливает фоновый обработчик микро-батчей и отменяет запросы, которые он не успел забрать из очереди.
         """
-        Возвращает матрицу SHAP values для переданных векторов.
-        :param vectors: Список векторов признаков (List[List[float]]).
-        :return: Массив (или список массивов) SHAP values.
+        worker, queue = cls._batch_worker, cls._batch_queue
+        cls._batch_worker = None
+        cls._batch_queue = None
+        if worker is not None and not worker.done():
+            worker.cancel()
+            if worker.get_loop() is asyncio.get_running_loop():
+                await asyncio.wait([worker])
+        if queue is not None:
+            while not queue.empty():
+                _, future = queue.get_nowait()
+                future.cancel()
+
+    @classmethod
+    async def _run_batch_worker(cls, queue: asyncio.Queue):
         """
-        if cls._explainer is None:
-            cls.load_model()
+        Фоновый цикл: собирает запросы из очереди, выполняет один вызов модели и раздает результаты.
+        """
+        window = settings.PREDICT_BATCH_WINDOW_MS / 1000
+        loop = asyncio.get_running_loop()
+        # Запрос, не поместившийся в предыдущий пакет, открывает следующий
+        carried = None
+        batch = []
+        try:
+            while True:
+                batch = [carried if carried is not None else await queue.get()]
+                carried = None
+                # Без окна — только уступаем цикл событий, чтобы уже отправленные запросы успели попасть в очередь
+                await asyncio.sleep(window)
+
+                size = len(batch[0][0])
+                while not queue.empty():
+                    request = queue.get_nowait()
+                    if size + len(request[0]) > settings.PREDICT_MAX_BATCH:
+                        carried = request
+                        break
+                    batch.append(request)
+                    size += len(request[0])
+
+                try:
+                    # Вызов модели блокирующий, поэтому выполняется в пуле потоков, а не в цикле событий
+                    predictions, shap_values = await loop.run_in_executor(
+                        None, cls.predict_and_explain, np.concatenate([rows for rows, _ in batch])
+                    )
+                    predictions = np.atleast_1d(predictions)
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
 
-        shap_values = cls._explainer.shap_values(vectors)
-        return shap_values
+                offset = 0
+                for rows, future in batch:
+                    end = offset + len(rows)
+                    if not future.done():
+                        future.set_result((predictions[offset:end], shap_values[offset:end]))
+                    offset = end
+        except asyncio.CancelledError:
+            # Остановка обработчика (в том числе во время окна ожидания): ожидающие запросы не должны зависнуть
+            for _, future in batch + ([carried] if carried is not None else []):
+                future.cancel()
+            raise
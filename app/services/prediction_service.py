@@ -1,12 +1,12 @@
 import numpy as np
-from typing import List, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
 from loguru import logger
 from app.models.api_schemas import (
+    FeatureContribution,
     RawApartmentInput,
     PredictionResponse,
     PredictionResponseItem,
-    ModelFeatures,
-    FeatureContribution,
 )
 from app.services.model_service import ModelService
 from app.services.transformer_service import TransformerService
@@ -35,79 +35,157 @@ class PredictionService:
 
         # 1. Трансформация данных (Raw -> Model Vector)
         vectors = self._transform_data(items)
-        if not vectors:
+        if not len(vectors):
             return PredictionResponse(predictions=[])
 
         # 2. ML Предсказание (Вызов модели) и SHAP
-        try:
-            log_predictions = self._model_service.predict(vectors)
-            shap_matrix = self._model_service.explain(vectors)
-        except Exception as e:
-            logger.error(f"Ошибка ML модели или SHAP: {e}")
-            raise RuntimeError(f"ML Model error: {e}")
+        log_predictions, shap_matrix = self._run_model(vectors)
 
         # 3. Пост-процессинг и применение бизнес-логики
         results = self._post_process_predictions(items, log_predictions, shap_matrix)
 
-        return PredictionResponse(predictions=results)
+        return PredictionResponse.model_construct(predictions=results)
+
+    def make_batch_prediction(self, items: List[RawApartmentInput]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Вариант make_prediction для больших пакетов.
+        Результат собирается из простых словарей той же структуры, что и PredictionResponse,
+        без построения Pydantic-моделей на каждый объект.
+
+        :param items: Список объектов с сырыми данными о квартирах.
+        :return: Словарь {"predictions": [...]}, готовый к сериализации в JSON.
+        :raises RuntimeError: В случае ошибки при выполнении ML модели.
+        """
+        logger.info(f"Обработка пакета из {len(items)} объектов (batch)")
+
+        vectors = self._transform_data(items)
+        if not len(vectors):
+            return {"predictions": []}
+
+        log_predictions, shap_matrix = self._run_model(vectors)
+
+        return {"predictions": self._build_prediction_rows(items, log_predictions, shap_matrix)}
+
+    async def make_prediction_async(self, items: List[RawApartmentInput]) -> PredictionResponse:
+        """
+        Асинхронный вариант make_prediction: предсказание выполняется через микро-батчер ModelService,
+        который объединяет конкурентные запросы в один вызов модели.
+
+        :param items: Список объектов с сырыми данными о квартирах.
+        :return: Ответ API с прогнозами, диапазонами цен и SHAP-объяснениями.
+        :raises RuntimeError: В случае ошибки при выполнении ML модели.
+        """
+        logger.info(f"Обработка пакета из {len(items)} объектов")
+
+        vectors = self._transform_data(items)
+        if not len(vectors):
+            return PredictionResponse(predictions=[])
+
+        log_predictions, shap_matrix = await self._run_model_async(vectors)
+
+        results = self._post_process_predictions(items, log_predictions, shap_matrix)
+
+        return PredictionResponse.model_construct(predictions=results)
+
+    def _run_model(self, vectors: np.ndarray):
+        """
+        Выполняет предсказание и расчет SHAP values для матрицы признаков
+        (одним вызовом CatBoost: предсказание — сумма SHAP values строки вместе с bias).
+        :raises RuntimeError: В случае ошибки при выполнении ML модели.
+        """
+        with self._model_errors():
+            return self._model_service.predict_and_explain(vectors)
+
+    async def _run_model_async(self, vectors: np.ndarray):
+        """
+        Асинхронный вариант _run_model: вызов модели проходит через микро-батчер ModelService.
+        :raises RuntimeError: В случае ошибки при выполнении ML модели.
+        """
+        with self._model_errors():
+            return await self._model_service.predict_and_explain_async(vectors)
+
+    @staticmethod
+    @contextmanager
+    def _model_errors():
+        """
+        Логирует ошибку вызова модели и пробрасывает ее как RuntimeError (эндпоинты отвечают на нее 500).
+        """
+        try:
+            yield
+        except Exception as e:
+            logger.error(f"Ошибка ML модели или SHAP: {e}")
+            raise RuntimeError(f"ML Model error: {e}")
 
-    def _transform_data(self, items: List[RawApartmentInput]) -> List[list]:
+    def _transform_data(self, items: List[RawApartmentInput]) -> np.ndarray:
         """
         Преобразует входные данные в формат, понятный модели CatBoost.
+        Матрица признаков (float32 — нативный тип CatBoost, порядок колонок — как в модели)
+        собирается трансформером целиком для всего пакета.
         """
-        vectors = []
-        for item in items:
-            try:
-                model_features = self._transformer_service.transform(item)
-                vectors.append(model_features.to_list())
-            except Exception as e:
-                logger.error(f"Ошибка трансформации для объекта '{item.title}': {e}")
-                raise ValueError(f"Data transformation error: {e}")
-        return vectors
+        idx_map = self._model_service.get_feature_index()
+        try:
+            return self._transformer_service.transform_batch(items, idx_map)
+        except Exception as e:
+            logger.error(f"Ошибка трансформации пакета из {len(items)} объектов: {e}")
+            raise ValueError(f"Data transformation error: {e}")
 
     def _post_process_predictions(
         self, items: List[RawApartmentInput], log_predictions, shap_matrix
     ) -> List[PredictionResponseItem]:
+        """
+        Формирует объекты ответа API из результатов модели.
+        Данные формируются внутри сервиса, поэтому модели создаются через model_construct — без валидации.
+        """
+        rows = self._build_prediction_rows(items, log_predictions, shap_matrix)
+        for row in rows:
+            row["feature_contributions"] = [
+                FeatureContribution.model_construct(**contribution) for contribution in row["feature_contributions"]
+            ]
+        return [PredictionResponseItem.model_construct(**row) for row in rows]
+
+    def _build_prediction_rows(
+        self, items: List[RawApartmentInput], log_predictions, shap_matrix
+    ) -> List[Dict[str, Any]]:
         """
         Преобразует логарифмические предсказания обратно в рубли,
         считает диапазоны, оценивает выгодность и формирует объяснения (SHAP).
+        Возвращает простые словари со структурой PredictionResponseItem.
         """
-        response_items = []
-        feature_names = ModelFeatures.get_feature_names()
+        feature_names = self._model_service.get_feature_names()
 
-        # Если модель вернула одно скаляр, превращаем в список
-        if np.isscalar(log_predictions):
-            log_predictions = [log_predictions]
-
-        shap_matrix = np.array(shap_matrix)
+        # Точность float64 сохраняется: округленные вклады должны совпадать со значениями модели
+        shap_matrix = np.asarray(shap_matrix, dtype=np.float64)
         if shap_matrix.ndim == 1:
             shap_matrix = shap_matrix.reshape(1, -1)
 
-        for i, (item, log_price) in enumerate(zip(items, log_predictions)):
-            # 1. Обратное преобразование (exp) и защита от переполнения
-            clean_log = min(log_price, 20)
-            price = int(np.expm1(clean_log))
-
-            # 2. Расчет диапазона цен
-            margin = settings.PREDICTION_MARGIN_PERCENT
-            low = int(price * (1 - margin))
-            high = int(price * (1 + margin))
-
+        # 1. Обратное преобразование (exp) и защита от переполнения — сразу для всего пакета
+        # (atleast_1d: модель может вернуть скаляр для одной строки)
+        log_arr = np.minimum(np.atleast_1d(np.asarray(log_predictions, dtype=np.float64)), 20.0)
+        price_arr = np.expm1(log_arr)
+
+        # 2. Расчет диапазона цен
+        margin = settings.PREDICTION_MARGIN_PERCENT
+        prices = price_arr.astype(np.int64)
+        lows = (prices * (1 - margin)).astype(np.int64).tolist()
+        highs = (prices * (1 + margin)).astype(np.int64).tolist()
+        prices = prices.tolist()
+
+        # Список ответов выделяется сразу нужной длины и заполняется по индексу
+        response_items = [None] * len(prices)
+        for i, (item, price, low, high, shap_row) in enumerate(zip(items, prices, lows, highs, shap_matrix)):
             # 3. Расчет процента недооцененности
             undervalued_pct = self._calculate_undervaluation(price, item.price_per_month)
 
             # 4. Формирование SHAP-вкладов
-            contributions = self._get_feature_contributions(shap_matrix[i], feature_names)
-
-            response_items.append(
-                PredictionResponseItem(
-                    predicted_price=price,
-                    price_range_low=low,
-                    price_range_high=high,
-                    undervalued_percent=undervalued_pct,
-                    feature_contributions=contributions,
-                )
-            )
+            contributions = self._get_feature_contributions(shap_row, feature_names)
+
+            response_items[i] = {
+                "predicted_price": price,
+                "price_range_low": low,
+                "price_range_high": high,
+                "undervalued_percent": undervalued_pct,
+                "feature_contributions": contributions,
+            }
 
         return response_items
 
@@ -124,12 +202,11 @@ class PredictionService:
 
     def _get_feature_contributions(
         self, shap_values: np.ndarray, feature_names: List[str], limit: int = 15
-    ) -> List[FeatureContribution]:
+    ) -> List[Dict[str, Any]]:
         """
         Сопоставляет SHAP values с именами признаков и сортирует их по абсолютной величине влияния.
-        Возвращает топ наиболее значимых признаков.
+        Возвращает топ наиболее значимых признаков (словари со структурой FeatureContribution).
         """
-        contributions: List[FeatureContribution] = []
         # Проверяем, что длины совпадают
         if len(shap_values) != len(feature_names):
             logger.warning(f"SHAP size mismatch: got {len(shap_values)}, expected {len(feature_names)}")
@@ -138,16 +215,13 @@ class PredictionService:
         else:
             min_len = len(shap_values)
 
-        for idx in range(min_len):
-            contributions.append(
-                FeatureContribution(
-                    feature_name=feature_names[idx],
-                    influence=round(shap_values[idx], settings.SHAP_INFLUENCE_ROUND_PRECISION),
-                )
-            )
-
-        # Сортируем по абсолютному значению влияния (самые важные в начале)
-        contributions.sort(key=lambda x: abs(x.influence), reverse=True)
+        # Округление и выбор топа по абсолютному значению влияния — векторно.
+        # Устойчивая сортировка сохраняет порядок признаков при равных значениях.
+        rounded = np.round(np.asarray(shap_values[:min_len], dtype=np.float64), settings.SHAP_INFLUENCE_ROUND_PRECISION)
+        top_idx = np.argsort(-np.abs(rounded), kind="stable")[:limit]
 
-        # Возвращаем топ
-        return contributions[:limit]
+        # Объекты создаются только для отобранных признаков
+        return [
+            {"feature_name": feature_names[idx], "influence": influence}
+            for idx, influence in zip(top_idx.tolist(), rounded[top_idx].tolist())
+        ]
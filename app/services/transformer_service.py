@@ -1,7 +1,95 @@
 import re
-from typing import Dict, Set
-from loguru import logger
+import sys
+from bisect import bisect_left
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Set
+import numpy as np
 from app.models.api_schemas import RawApartmentInput, ModelFeatures
+from app.core.config import settings
+
+# Регулярные выражения компилируются один раз при импорте модуля
+_RE_BALCONY = re.compile(r"(\d+)\s+балк")
+_RE_LOGGIA = re.compile(r"(\d+)\s+лодж")
+
+
+class _DigitsOnlyTable(dict):
+    """
+    Таблица для str.translate, оставляющая в строке только цифры (как удаление по r"[^\\d]").
+    Заранее заполнена для латиницы, кириллицы, пунктуации и знаков валют — для них поиск идет на уровне C.
+    Прочие символы классифицируются на лету и в таблицу не добавляются, чтобы ее размер не зависел от входных данных.
+    """
+
+    _PREFILLED_RANGES = (range(0x500), range(0x2000, 0x20D0))
+
+    def __init__(self):
+        super().__init__(
+            (code, code if chr(code).isdecimal() else None) for codes in self._PREFILLED_RANGES for code in codes
+        )
+
+    def __missing__(self, code: int):
+        return code if chr(code).isdecimal() else None
+
+
+_DIGITS_ONLY = _DigitsOnlyTable()
+
+# Флаги удобств: (флаг, английский тег, русское название)
+_FACTS_FLAGS = tuple(
+    (sys.intern(flag), sys.intern(en), sys.intern(ru))
+    for flag, en, ru in (
+        ("has_bath_flg", "bathtub", "ванна"),
+        ("has_shower_flg", "shower_cabin", "душевая кабина"),
+        ("has_internet_flg", "internet", "интернет"),
+        ("has_ac_flg", "ac", "кондиционер"),
+        ("has_room_furniture_flg", "room_furniture", "мебель в комнатах"),
+        ("has_kitchen_furniture_flg", "kitchen_furniture", "мебель на кухне"),
+        ("has_dishwasher_flg", "dishwasher", "посудомоечная машина"),
+        ("has_washer_flg", "washing_machine", "стиральная машина"),
+        ("has_tv_flg", "tv", "телевизор"),
+        ("has_fridge_flg", "refrigerator", "холодильник"),
+    )
+)
+
+# Номер бита флага удобства для каждого известного названия (английского и русского)
+_FACT_BITS = {name: 1 << bit for bit, (_, en, ru) in enumerate(_FACTS_FLAGS) for name in (en, ru)}
+
+# Верхние границы (включительно) эпох постройки: <=1917, <=1991, <=2013, позже
+_ERA_BOUNDS = (1917, 1991, 2013)
+
+# Ключевые слова для поиска подстрок (в нижнем регистре)
+_DISTRICT_KEYWORDS = {
+    "красногвардейский": "district_krasnogvardeysky_flg",
+    "красносельский": "district_krasnoselsky_flg",
+    "московский": "district_moskovsky_flg",
+    "невский": "district_nevsky_flg",
+    "приморский": "district_primorsky_flg",
+    "выборгский": "district_vyborgsky_flg",
+}
+_ENTRANCE_KEYWORDS = {
+    "мусоропровод": "has_garbage_chute_flg",
+    "консьерж": "has_concierge_flg",
+}
+_INDIVIDUAL_PROJECT_KEYWORD = "индивидуальный проект"
+
+# Значения по умолчанию для групп флагов: помощники выставляют только сработавшие флаги
+_FACTS_DEFAULT = {flag: 0 for flag, _, _ in _FACTS_FLAGS}
+_UTILITIES_DEFAULT = {"utility_fixed_bill": 0, "utility_usage_bill_flg": 0, "utility_counters_extra_flg": 0}
+_BALCONY_DEFAULT = {"balcony_cnt": 0, "loggia_cnt": 0}
+_ENTRANCE_DEFAULT = {flag: 0 for flag in _ENTRANCE_KEYWORDS.values()}
+_HOUSE_TYPE_DEFAULT = {"house_type_monolithic_flg": 0, "house_type_monolithic_brick_flg": 0, "house_type_panel_flg": 0}
+_DISTRICT_DEFAULT = {**{flag: 0 for flag in _DISTRICT_KEYWORDS.values()}, "district_other_flg": 1}
+# Общий шаблон всех производных признаков: _derived_features заполняет один словарь за проход
+_DERIVED_DEFAULT = {
+    "floor": 0.0,
+    **_FACTS_DEFAULT,
+    **_UTILITIES_DEFAULT,
+    **_BALCONY_DEFAULT,
+    **_ENTRANCE_DEFAULT,
+    "individual_project_flg": 0,
+    "era_cat": 0,
+    **_HOUSE_TYPE_DEFAULT,
+    **_DISTRICT_DEFAULT,
+}
 
 
 class TransformerService:
@@ -33,83 +121,155 @@ class TransformerService:
         "котел/квартирное отопление": 3,
     }
 
-    ERA_RULES = {
-        1: lambda y: y <= 1917,
-        2: lambda y: 1917 < y <= 1991,
-        3: lambda y: 1991 < y <= 2013,
-        4: lambda y: y > 2013,
+    # Категориальные признаки: имя поля -> словарь кодов
+    CATEGORICAL_MAPPINGS = {
+        "repair_cat": REPAIR_CAT_MAPPING,
+        "parking_cat": PARKING_CAT_MAPPING,
+        "heating_cat": HEATING_CAT_MAPPING,
     }
 
+    # Числовые признаки, которые переносятся из входных данных без изменений
+    PASSTHROUGH_FIELDS = (
+        "metro_nearest_time",
+        "total_area",
+        "comission",
+        "prepayment_months_cnt",
+        "rent_term_months_cnt",
+        "combined_bathrooms_cnt",
+        "separate_bathrooms_cnt",
+        "freight_elevators_cnt",
+        "passenger_elevators_cnt",
+        "entrances_cnt",
+    )
+
+    def __init__(self):
+        # Кэш производных признаков по содержимому исходных полей: повторные объявления и ретраи
+        # не разбираются заново. Кэш у каждого экземпляра свой (сервис используется как синглтон).
+        self._derived_cached = lru_cache(maxsize=settings.TRANSFORM_CACHE_SIZE)(self._compute_derived)
+
     def transform(self, item: RawApartmentInput) -> ModelFeatures:
         """
         Основной метод преобразования объекта квартиры в признаки для модели.
+        Возвращает валидированный ModelFeatures — используется вне горячего пути (отладка, тесты).
+        """
+        return ModelFeatures(**self._build_features(item))
+
+    def transform_batch(self, items: List[RawApartmentInput], idx_map: Dict[str, int]) -> np.ndarray:
+        """
+        Преобразует пакет квартир в матрицу признаков float32.
+        Числовые и категориальные признаки заполняются целыми колонками,
+        построчно вычисляются только признаки, требующие разбора строк.
+
+        :param idx_map: Отображение "имя признака -> номер колонки".
         """
-        try:
-            features = item.features
-            facts_set = {f.lower() for f in item.facts}
-
-            # 1. Числовые признаки и простые вычисления
-            metro_nearest_time = features.metro_nearest_time
-            total_area = features.total_area
-            floor_val = self._get_floor_val(features.floor_number, features.total_floors_cnt)
-
-            # 2. Логика парсинга текста
-            util_dict = self._parse_utilities(features.hcs_price)
-            balcony_dict = self._parse_balcony_loggia(features.balcony_loggia_cnt)
-            entrance_dict = self._get_entrance_flags(features.entrance_info, facts_set)
-
-            # 3. Флаги и категории
-            ind_proj_flg = self._get_individual_project_flag(features.construction_series)
-            era_cat = self._get_era_cat(features.build_year)
-
-            # 4. Маппинг категориальных значений
-            repair_cat = self.REPAIR_CAT_MAPPING.get(str(features.repair_cat).lower(), 0)
-            parking_cat = self.PARKING_CAT_MAPPING.get(str(features.parking_cat).lower(), 0)
-            heating_cat = self.HEATING_CAT_MAPPING.get(str(features.heating_cat).lower(), 0)
-
-            # 5. One-Hot Encoding групп признаков
-            house_type_flags = self._get_house_type_flags(features.house_type_cat)
-            district_flags = self._get_district_flags(item.address)
-            facts_flags = self._get_facts_dict(facts_set)
-
-            # Сборка финального объекта с использованием **kwargs распаковки
-            return ModelFeatures(
-                metro_nearest_time=metro_nearest_time,
-                total_area=total_area,
-                floor=floor_val,
-                # Факты (удобства)
-                **facts_flags,
-                # Коммунальные платежи
-                **util_dict,
-                # Финансовые показатели
-                comission=features.comission,
-                prepayment_months_cnt=features.prepayment_months_cnt,
-                rent_term_months_cnt=features.rent_term_months_cnt,
-                # Комнаты и планировка
-                combined_bathrooms_cnt=features.combined_bathrooms_cnt,
-                separate_bathrooms_cnt=features.separate_bathrooms_cnt,
-                repair_cat=repair_cat,
-                freight_elevators_cnt=features.freight_elevators_cnt,
-                passenger_elevators_cnt=features.passenger_elevators_cnt,
-                parking_cat=parking_cat,
-                heating_cat=heating_cat,
-                # Балконы / лоджии
-                **balcony_dict,
-                # Подъезд
-                **entrance_dict,
-                entrances_cnt=features.entrances_cnt,
-                # Информация о здании
-                individual_project_flg=ind_proj_flg,
-                era_cat=era_cat,
-                # Тип дома (OHE)
-                **house_type_flags,
-                # Районы (OHE)
-                **district_flags,
-            )
-
-        except Exception as e:
-            logger.error(f"Ошибка при трансформации объекта: {item.title}. Ошибка: {e}")
-            raise e
+        out = np.empty((len(items), len(idx_map)), dtype=np.float32)
+        features = [item.features for item in items]
+
+        # 1. Числовые признаки — по колонкам
+        for name in self.PASSTHROUGH_FIELDS:
+            out[:, idx_map[name]] = [getattr(f, name) for f in features]
+
+        # 2. Маппинг категориальных значений — по колонкам
+        for name in self.CATEGORICAL_MAPPINGS:
+            out[:, idx_map[name]] = [self._map_category(name, getattr(f, name)) for f in features]
+
+        # 3. Разбор строк и OHE — построчно в списки значений (порядок ключей задан _DERIVED_DEFAULT),
+        # затем одной записью блока колонок в матрицу
+        derived_columns = [idx_map[name] for name in _DERIVED_DEFAULT]
+        derived = [list(self._derived_features(item).values()) for item in items]
+        out[:, derived_columns] = np.array(derived, dtype=np.float32).reshape(len(items), len(derived_columns))
+
+        return out
+
+    def _build_features(self, item: RawApartmentInput) -> Dict[str, float]:
+        """
+        Вычисляет словарь "имя признака -> значение" для одной квартиры.
+        """
+        features = item.features
+        values = {name: getattr(features, name) for name in self.PASSTHROUGH_FIELDS}
+        for name in self.CATEGORICAL_MAPPINGS:
+            values[name] = self._map_category(name, getattr(features, name))
+        values.update(self._derived_features(item))
+        return values
+
+    def _derived_features(self, item: RawApartmentInput) -> Mapping[str, float]:
+        """
+        Вычисляет признаки, требующие разбора строк и One-Hot Encoding.
+        Результат берется из LRU-кэша по значениям исходных полей (словарь только для чтения).
+        Исключения не перехватываются: их логирует и оборачивает вызывающий код (PredictionService).
+        """
+        features = item.features
+        return self._derived_cached(
+            item.address,
+            tuple(item.facts),
+            features.floor_number,
+            features.total_floors_cnt,
+            features.hcs_price,
+            features.balcony_loggia_cnt,
+            features.entrance_info,
+            features.construction_series,
+            features.build_year,
+            features.house_type_cat,
+        )
+
+    def _compute_derived(
+        self,
+        address: str,
+        facts: tuple,
+        floor_number: int,
+        total_floors_cnt: int,
+        hcs_price: str,
+        balcony_loggia_cnt: str | None,
+        entrance_info: str | None,
+        construction_series: str | None,
+        build_year: int | None,
+        house_type_cat: str | None,
+    ) -> Mapping[str, float]:
+        """
+        Вычисляет производные признаки по значениям исходных полей (вызывается через кэш _derived_cached).
+        """
+        facts_set = frozenset(map(str.lower, facts))
+
+        # Строки приводятся к нижнему регистру один раз и передаются в помощники уже нормализованными
+        address_lower = address.lower()
+        house_type_lower = str(house_type_cat).lower()
+        entrance_lower = (entrance_info or "").lower()
+        series_lower = (construction_series or "").lower()
+        hcs_lower = (hcs_price or "").lower()
+
+        # Все помощники пишут в один словарь, предзаполненный значениями по умолчанию
+        res = _DERIVED_DEFAULT.copy()
+
+        # 1. Простые вычисления
+        res["floor"] = self._get_floor_val(floor_number, total_floors_cnt)
+
+        # 2. Логика парсинга текста: коммунальные платежи, балконы / лоджии, подъезд
+        self._parse_utilities(hcs_price, hcs_lower, res)
+        self._parse_balcony_loggia(balcony_loggia_cnt, res)
+        self._get_entrance_flags(entrance_lower, res)
+
+        # 3. Флаги и категории (информация о здании)
+        res["individual_project_flg"] = self._get_individual_project_flag(series_lower)
+        res["era_cat"] = self._get_era_cat(build_year)
+
+        # 4. One-Hot Encoding групп признаков: тип дома, районы, факты (удобства)
+        self._get_house_type_flags(house_type_lower, res)
+        self._get_district_flags(address_lower, res)
+        self._get_facts_dict(facts_set, res)
+
+        # Результат разделяется между вызовами через кэш, поэтому отдается только для чтения
+        return MappingProxyType(res)
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _map_category(name: str, value) -> int:
+        """
+        Возвращает код категориального признака name по словарю с ключами в нижнем регистре
+        (0 для пустых и неизвестных). Набор значений мал, поэтому результаты кэшируются.
+        """
+        if not isinstance(value, str):
+            return 0
+        return TransformerService.CATEGORICAL_MAPPINGS[name].get(value.lower(), 0)
 
     def _get_floor_val(self, floor_number: int, total_floors: int) -> float:
         """Вычисляет относительный этаж (0.0 - 1.0)."""
@@ -117,103 +277,80 @@ class TransformerService:
             return floor_number / total_floors
         return 0.0
 
-    def _parse_utilities(self, hcs_price_str: str) -> Dict[str, int]:
-        """Парсит строку коммунальных платежей."""
-        res = {"utility_fixed_bill": 0, "utility_usage_bill_flg": 0, "utility_counters_extra_flg": 0}
-        if not hcs_price_str:
-            return res
-
-        hcs_lower = hcs_price_str.lower()
-        clean_digits = re.sub(r"[^\d]", "", hcs_price_str)
+    def _parse_utilities(self, hcs_price_str: str, hcs_lower: str, res: Dict[str, float]) -> None:
+        """
+        Парсит строку коммунальных платежей.
+        hcs_lower — та же строка в нижнем регистре (для поиска ключевых слов).
+        """
+        clean_digits = hcs_price_str.translate(_DIGITS_ONLY) if hcs_price_str else ""
         if clean_digits:
             res["utility_fixed_bill"] = int(clean_digits)
 
-        res["utility_usage_bill_flg"] = int("не включена" in hcs_lower)
-        res["utility_counters_extra_flg"] = int("не включена" in hcs_lower or "без счётчиков" in hcs_lower)
-        return res
+        if "не включена" in hcs_lower:
+            res["utility_usage_bill_flg"] = 1
+            res["utility_counters_extra_flg"] = 1
+        elif "без счётчиков" in hcs_lower:
+            res["utility_counters_extra_flg"] = 1
 
-    def _parse_balcony_loggia(self, bl_str: str | None) -> Dict[str, int]:
+    def _parse_balcony_loggia(self, bl_str: str | None, res: Dict[str, float]) -> None:
         """Извлекает количество балконов и лоджий из строки."""
-        res = {"balcony_cnt": 0, "loggia_cnt": 0}
         if not bl_str:
-            return res
+            return
 
         bl_lower = bl_str.lower()
 
-        balcony_match = re.search(r"(\d+)\s+балк", bl_lower)
+        balcony_match = _RE_BALCONY.search(bl_lower)
         if balcony_match:
             res["balcony_cnt"] = int(balcony_match.group(1))
 
-        loggia_match = re.search(r"(\d+)\s+лодж", bl_lower)
+        loggia_match = _RE_LOGGIA.search(bl_lower)
         if loggia_match:
             res["loggia_cnt"] = int(loggia_match.group(1))
 
-        return res
-
-    def _get_entrance_flags(self, entrance_info: str | None, facts_set: Set[str]) -> Dict[str, int]:
-        """Определяет наличие мусоропровода и консьержа."""
-        res = {"has_garbage_chute_flg": 0, "has_concierge_flg": 0}
+    def _get_entrance_flags(self, entrance_lower: str, res: Dict[str, float]) -> None:
+        """Определяет наличие мусоропровода и консьержа по информации о подъезде (в нижнем регистре)."""
+        for word, flag in _ENTRANCE_KEYWORDS.items():
+            if word in entrance_lower:
+                res[flag] = 1
 
-        if entrance_info:
-            entrance_lower = entrance_info.lower()
-            if "мусоропровод" in entrance_lower:
-                res["has_garbage_chute_flg"] = 1
-            if "консьерж" in entrance_lower:
-                res["has_concierge_flg"] = 1
-        return res
-
-    def _get_individual_project_flag(self, series: str | None) -> int:
-        """Проверяет, является ли проект индивидуальным."""
-        if series and "индивидуальный проект" in series.lower():
-            return 1
-        return 0
+    def _get_individual_project_flag(self, series_lower: str) -> int:
+        """Проверяет, является ли проект индивидуальным (по строительной серии в нижнем регистре)."""
+        return int(_INDIVIDUAL_PROJECT_KEYWORD in series_lower)
 
     def _get_era_cat(self, year: int | None) -> int:
         """Определяет категорию эпохи постройки."""
         if not year:
             return 0
-        return next((cat for cat, rule in self.ERA_RULES.items() if rule(year)), 0)
-
-    def _get_house_type_flags(self, house_type: str | None) -> Dict[str, int]:
-        """Формирует OHE флаги для типа дома."""
-        ht = str(house_type).lower()
-        return {
-            "house_type_monolithic_flg": 1 if "монолит" in ht and "кирпич" not in ht else 0,
-            "house_type_monolithic_brick_flg": 1 if "монолит" in ht and "кирпич" in ht else 0,
-            "house_type_panel_flg": 1 if "панель" in ht else 0,
-        }
-
-    def _get_district_flags(self, address: str) -> Dict[str, int]:
-        """Формирует OHE флаги для районов Санкт-Петербурга."""
-        addr = address.lower()
-        flags = {
-            "district_krasnogvardeysky_flg": 1 if "красногвардейский" in addr else 0,
-            "district_krasnoselsky_flg": 1 if "красносельский" in addr else 0,
-            "district_moskovsky_flg": 1 if "московский" in addr else 0,
-            "district_nevsky_flg": 1 if "невский" in addr else 0,
-            "district_primorsky_flg": 1 if "приморский" in addr else 0,
-            "district_vyborgsky_flg": 1 if "выборгский" in addr else 0,
-        }
-
-        # Логика для "Другого" района
-        flags["district_other_flg"] = int(sum(flags.values()) == 0)
-
-        return flags
-
-    def _get_facts_dict(self, facts_set: Set[str]) -> Dict[str, int]:
-        """
-        Формирует словарь флагов удобств на основе списка фактов.
+        return bisect_left(_ERA_BOUNDS, year) + 1
+
+    def _get_house_type_flags(self, house_type_lower: str, res: Dict[str, float]) -> None:
+        """Формирует OHE флаги для типа дома по его описанию в нижнем регистре."""
+        if "монолит" in house_type_lower:
+            if "кирпич" in house_type_lower:
+                res["house_type_monolithic_brick_flg"] = 1
+            else:
+                res["house_type_monolithic_flg"] = 1
+        if "панель" in house_type_lower:
+            res["house_type_panel_flg"] = 1
+
+    def _get_district_flags(self, address_lower: str, res: Dict[str, float]) -> None:
+        """Формирует OHE флаги для районов Санкт-Петербурга по адресу в нижнем регистре."""
+        for word, flag in _DISTRICT_KEYWORDS.items():
+            if word in address_lower:
+                res[flag] = 1
+                # Логика для "Другого" района: флаг снимается, если найден хотя бы один известный район
+                res["district_other_flg"] = 0
+
+    def _get_facts_dict(self, facts_set: Set[str], res: Dict[str, float]) -> None:
+        """
+        Выставляет флаги удобств на основе списка фактов.
         Поддерживает поиск как английских (internal keys), так и русских названий.
         """
-        return {
-            "has_bath_flg": 1 if "bathtub" in facts_set or "ванна" in facts_set else 0,
-            "has_shower_flg": 1 if "shower_cabin" in facts_set or "душевая кабина" in facts_set else 0,
-            "has_internet_flg": 1 if "internet" in facts_set or "интернет" in facts_set else 0,
-            "has_ac_flg": 1 if "ac" in facts_set or "кондиционер" in facts_set else 0,
-            "has_room_furniture_flg": 1 if "room_furniture" in facts_set or "мебель в комнатах" in facts_set else 0,
-            "has_kitchen_furniture_flg": 1 if "kitchen_furniture" in facts_set or "мебель на кухне" in facts_set else 0,
-            "has_dishwasher_flg": 1 if "dishwasher" in facts_set or "посудомоечная машина" in facts_set else 0,
-            "has_washer_flg": 1 if "washing_machine" in facts_set or "стиральная машина" in facts_set else 0,
-            "has_tv_flg": 1 if "tv" in facts_set or "телевизор" in facts_set else 0,
-            "has_fridge_flg": 1 if "refrigerator" in facts_set or "холодильник" in facts_set else 0,
-        }
+        # Один проход по фактам квартиры собирает битовую маску, флаги читаются из нее
+        mask = 0
+        for fact in facts_set:
+            mask |= _FACT_BITS.get(fact, 0)
+        if mask:
+            for bit, (flag, _, _) in enumerate(_FACTS_FLAGS):
+                if mask >> bit & 1:
+                    res[flag] = 1
@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+ITEMS = [
+    {
+        "title": "2-room flat",
+        "price_per_month": 45000,
+        "address": "Санкт-Петербург, р-н Московский, ул. Типанова",
+        "features": {
+            "total_area": 52.5,
+            "floor_number": 5,
+            "total_floors_cnt": 10,
+            "hcs_price": "5000 ₽ (счётчики включены)",
+            "balcony_loggia_cnt": "1 балкон / 2 лоджии",
+            "entrance_info": "Консьерж, мусоропровод",
+            "build_year": 2010,
+            "repair_cat": "Евроремонт",
+            "house_type_cat": "Монолитно-кирпичный",
+        },
+        "facts": ["internet", "tv", "refrigerator"],
+    },
+    {
+        "title": "Studio",
+        "address": "Санкт-Петербург, р-н Колпинский",
+        "features": {"total_area": 30, "floor_number": 1},
+    },
+    {
+        "title": "Panel flat",
+        "price_per_month": 30000,
+        "address": "Санкт-Петербург, р-н Невский",
+        "features": {"total_area": 41, "floor_number": 9, "total_floors_cnt": 9, "house_type_cat": "Панельный"},
+        "facts": ["Стиральная машина"],
+    },
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    # The context manager runs the startup event, which loads and warms up the real model
+    with TestClient(app) as client:
+        yield client
+
+
+class TestPredictEndpoints:
+    @pytest.mark.parametrize("items", [ITEMS, ITEMS[:1], []])
+    def test_batch_matches_predict(self, client, items):
+        single = client.post("/api/v1/predict", json=items)
+        batch = client.post("/api/v1/predict/batch", json=items)
+
+        assert single.status_code == batch.status_code == 200
+        assert batch.json() == single.json()
+        assert len(batch.json()["predictions"]) == len(items)
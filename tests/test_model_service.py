@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.model_service import ModelService
+
+
+class TestModelServiceBatching:
+    @pytest.fixture
+    def calls(self, monkeypatch):
+        calls = []
+
+        def fake_predict_and_explain(rows):
+            # The model call must run in the thread pool, not on the event loop thread
+            assert threading.current_thread() is not threading.main_thread()
+            calls.append(len(rows))
+            return rows[:, 0] * 10, rows * 2
+
+        monkeypatch.setattr(ModelService, "predict_and_explain", fake_predict_and_explain)
+        monkeypatch.setattr(settings, "PREDICT_MAX_BATCH", 4)
+        return calls
+
+    @staticmethod
+    def run_concurrently(sizes):
+        async def main():
+            requests = [np.full((size, 3), i, dtype=np.float32) for i, size in enumerate(sizes)]
+            try:
+                results = await asyncio.gather(
+                    *(ModelService.predict_and_explain_async(rows) for rows in requests), return_exceptions=True
+                )
+            finally:
+                await ModelService.stop_batching()
+            return requests, results
+
+        return asyncio.run(main())
+
+    def test_concurrent_requests_get_own_rows(self, calls):
+        requests, results = self.run_concurrently([1, 3, 2, 1, 5])
+
+        for rows, (predictions, shap_values) in zip(requests, results):
+            assert predictions.tolist() == (rows[:, 0] * 10).tolist()
+            assert (shap_values == rows * 2).all()
+
+        # Batches never exceed PREDICT_MAX_BATCH; a single oversized request runs on its own
+        assert calls == [4, 3, 5]
+
+    def test_error_reaches_every_request(self, monkeypatch):
+        def failing_predict_and_explain(rows):
+            raise RuntimeError("model failed")
+
+        monkeypatch.setattr(ModelService, "predict_and_explain", failing_predict_and_explain)
+
+        _, results = self.run_concurrently([1, 2, 1])
+
+        assert len(results) == 3
+        for result in results:
+            assert isinstance(result, RuntimeError)
+            assert str(result) == "model failed"
+
+    def test_stop_during_window_cancels_pending_requests(self, calls, monkeypatch):
+        monkeypatch.setattr(settings, "PREDICT_BATCH_WINDOW_MS", 50.0)
+
+        async def main():
+            tasks = [
+                asyncio.create_task(ModelService.predict_and_explain_async(np.zeros((1, 3), dtype=np.float32)))
+                for _ in range(2)
+            ]
+            # The worker holds the first request in its window; the second is still queued
+            await asyncio.sleep(0.01)
+            await ModelService.stop_batching()
+            done, _ = await asyncio.wait(tasks, timeout=1)
+            return tasks, done
+
+        tasks, done = asyncio.run(main())
+
+        assert len(done) == 2
+        assert all(task.cancelled() for task in tasks)
+        assert calls == []
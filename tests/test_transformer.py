@@ -1,6 +1,6 @@
 import pytest
 from app.services.transformer_service import TransformerService
-from app.models.api_schemas import RawApartmentInput, ApartmentFeaturesInput
+from app.models.api_schemas import RawApartmentInput, ApartmentFeaturesInput, ModelFeatures
 
 
 class TestTransformerService:
@@ -8,6 +8,16 @@ class TestTransformerService:
     def t(self):
         return TransformerService()
 
+    @staticmethod
+    def derive(t, address="Санкт-Петербург", facts=(), **features):
+        # Helpers expect pre-lowercased strings and fill a shared dict, so they are tested via _derived_features
+        raw = RawApartmentInput(
+            address=address,
+            features=ApartmentFeaturesInput(total_area=40.0, floor_number=1, **features),
+            facts=list(facts),
+        )
+        return t._derived_features(raw)
+
     # --- Unit Tests for Helper Methods ---
     def test_get_floor_val(self, t):
         assert t._get_floor_val(5, 10) == 0.5
@@ -16,57 +26,61 @@ class TestTransformerService:
 
     def test_parse_utilities(self, t):
         # Case 1: Fixed price, included
-        res = t._parse_utilities("10 000 ₽ (счётчики включены)")
+        res = self.derive(t, hcs_price="10 000 ₽ (счётчики включены)")
         assert res["utility_fixed_bill"] == 10000
         assert res["utility_usage_bill_flg"] == 0
         assert res["utility_counters_extra_flg"] == 0
 
         # Case 2: Not included
-        res = t._parse_utilities("5000 ₽ (ку не включена)")
+        res = self.derive(t, hcs_price="5000 ₽ (ку не включена)")
         assert res["utility_fixed_bill"] == 5000
         assert res["utility_usage_bill_flg"] == 1
         assert res["utility_counters_extra_flg"] == 1
 
         # Case 3: Empty
-        res = t._parse_utilities("")
+        res = self.derive(t, hcs_price="")
         assert res["utility_fixed_bill"] == 0
 
         # Case 4: Text without digits
-        res = t._parse_utilities("Включено")
+        res = self.derive(t, hcs_price="Включено")
         assert res["utility_fixed_bill"] == 0
 
     def test_parse_balcony_loggia(self, t):
-        assert t._parse_balcony_loggia("1 балк") == {"balcony_cnt": 1, "loggia_cnt": 0}
-        assert t._parse_balcony_loggia("2 лодж") == {"balcony_cnt": 0, "loggia_cnt": 2}
-        assert t._parse_balcony_loggia("1 балк, 1 лодж") == {"balcony_cnt": 1, "loggia_cnt": 1}
-        assert t._parse_balcony_loggia(None) == {"balcony_cnt": 0, "loggia_cnt": 0}
-        assert t._parse_balcony_loggia("") == {"balcony_cnt": 0, "loggia_cnt": 0}
+        def counts(bl_str):
+            res = self.derive(t, balcony_loggia_cnt=bl_str)
+            return {"balcony_cnt": res["balcony_cnt"], "loggia_cnt": res["loggia_cnt"]}
+
+        assert counts("1 балк") == {"balcony_cnt": 1, "loggia_cnt": 0}
+        assert counts("2 лодж") == {"balcony_cnt": 0, "loggia_cnt": 2}
+        assert counts("1 балк, 1 лодж") == {"balcony_cnt": 1, "loggia_cnt": 1}
+        assert counts(None) == {"balcony_cnt": 0, "loggia_cnt": 0}
+        assert counts("") == {"balcony_cnt": 0, "loggia_cnt": 0}
 
     def test_get_entrance_flags(self, t):
         # Case 1: Entrance info present
-        res = t._get_entrance_flags("Есть мусоропровод", set())
+        res = self.derive(t, entrance_info="Есть мусоропровод")
         assert res["has_garbage_chute_flg"] == 1
         assert res["has_concierge_flg"] == 0
 
-        res = t._get_entrance_flags("Есть консьерж", set())
+        res = self.derive(t, entrance_info="Есть консьерж")
         assert res["has_garbage_chute_flg"] == 0
         assert res["has_concierge_flg"] == 1
 
-        res = t._get_entrance_flags("мусоропровод, консьерж", set())
+        res = self.derive(t, entrance_info="мусоропровод, консьерж")
         assert res["has_garbage_chute_flg"] == 1
         assert res["has_concierge_flg"] == 1
 
-        # Case 2: Entrance info missing -> Flags are 0
-        res = t._get_entrance_flags(None, {"мусоропровод"})
+        # Case 2: Entrance info missing -> Flags are 0 (facts are not used)
+        res = self.derive(t, entrance_info=None, facts=["мусоропровод"])
         assert res["has_garbage_chute_flg"] == 0
 
-        res = t._get_entrance_flags("", {"консьерж"})
+        res = self.derive(t, entrance_info="", facts=["консьерж"])
         assert res["has_concierge_flg"] == 0
 
     def test_get_individual_project_flag(self, t):
-        assert t._get_individual_project_flag("Индивидуальный проект") == 1
-        assert t._get_individual_project_flag("137 серия") == 0
-        assert t._get_individual_project_flag(None) == 0
+        assert self.derive(t, construction_series="Индивидуальный проект")["individual_project_flg"] == 1
+        assert self.derive(t, construction_series="137 серия")["individual_project_flg"] == 0
+        assert self.derive(t, construction_series=None)["individual_project_flg"] == 0
 
     def test_get_era_cat(self, t):
         assert t._get_era_cat(1900) == 1
@@ -80,34 +94,43 @@ class TestTransformerService:
 
     def test_get_house_type_flags(self, t):
         # Monolith
-        res = t._get_house_type_flags("Монолитный")
+        res = self.derive(t, house_type_cat="Монолитный")
         assert res["house_type_monolithic_flg"] == 1
         assert res["house_type_monolithic_brick_flg"] == 0
         assert res["house_type_panel_flg"] == 0
 
         # Panel
-        res = t._get_house_type_flags("Панельный")
+        res = self.derive(t, house_type_cat="Панельный")
         assert res["house_type_monolithic_flg"] == 0
         assert res["house_type_panel_flg"] == 1
 
         # Monolith-Brick
-        res = t._get_house_type_flags("Монолитно-кирпичный")
+        res = self.derive(t, house_type_cat="Монолитно-кирпичный")
         assert res["house_type_monolithic_flg"] == 0
         assert res["house_type_monolithic_brick_flg"] == 1
 
     def test_get_district_flags(self, t):
         # Specific district
-        res = t._get_district_flags("Санкт-Петербург, р-н Московский, ул. Типанова")
+        res = self.derive(t, address="Санкт-Петербург, р-н Московский, ул. Типанова")
         assert res["district_moskovsky_flg"] == 1
         assert res["district_other_flg"] == 0
 
         # Baseline district (Central) -> All 0
-        res = t._get_district_flags("Санкт-Петербург, р-н Центральный, Невский пр.")
+        res = self.derive(t, address="Санкт-Петербург, р-н Центральный, Невский пр.")
         assert res["district_moskovsky_flg"] == 0
         assert res["district_other_flg"] == 0  # Correct, Central is baseline
 
         # Unknown district -> Other
-        res = t._get_district_flags("Санкт-Петербург, р-н Колпинский")
+        res = self.derive(t, address="Санкт-Петербург, р-н Колпинский")
+        assert res["district_other_flg"] == 1
+
+    def test_keywords_matched_in_own_field(self, t):
+        # Keywords count only in their own field: "монолит" in the address is not a house type
+        res = self.derive(t, address="ул. Монолитная, консьерж, индивидуальный проект, не включена")
+        assert res["house_type_monolithic_flg"] == 0
+        assert res["has_concierge_flg"] == 0
+        assert res["individual_project_flg"] == 0
+        assert res["utility_usage_bill_flg"] == 0
         assert res["district_other_flg"] == 1
 
     # --- Integration Test ---
@@ -140,3 +163,40 @@ class TestTransformerService:
         assert model_features.individual_project_flg == 1
         assert model_features.district_moskovsky_flg == 1
         assert model_features.has_internet_flg == 1
+
+    def test_transform_batch_matches_transform(self, t):
+        items = [
+            RawApartmentInput(
+                address="Санкт-Петербург, р-н Приморский",
+                features=ApartmentFeaturesInput(total_area=60.0, floor_number=2, heating_cat="Центральное"),
+                facts=["internet"],
+            ),
+            RawApartmentInput(
+                address="Санкт-Петербург, р-н Колпинский",
+                features=ApartmentFeaturesInput(total_area=28.0, floor_number=1, parking_cat="Подземная"),
+            ),
+        ]
+        names = ModelFeatures.get_feature_names()
+        idx_map = {name: idx for idx, name in enumerate(names)}
+
+        matrix = t.transform_batch(items, idx_map)
+
+        assert matrix.shape == (2, len(names))
+        for row, item in zip(matrix, items):
+            assert row.tolist() == pytest.approx(t.transform(item).to_list())
+        assert t.transform_batch([], idx_map).shape == (0, len(names))
+
+    def test_derived_features_cached(self, t):
+        raw = RawApartmentInput(
+            address="Санкт-Петербург, р-н Невский",
+            features=ApartmentFeaturesInput(total_area=40.0, floor_number=2, hcs_price="3000"),
+            facts=["tv"],
+        )
+        same = RawApartmentInput(**raw.model_dump())
+
+        derived = t._derived_features(raw)
+
+        assert t._derived_features(same) is derived
+        assert derived["utility_fixed_bill"] == 3000
+        with pytest.raises(TypeError):
+            derived["floor"] = 1.0